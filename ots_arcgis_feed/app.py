@@ -1,16 +1,31 @@
+import functools
 import os
 import pathlib
+import sys
 import traceback
 
-import yaml
 from flask import Blueprint, jsonify, Flask, current_app as app, request, send_from_directory
 from flask_security import roles_accepted
 from opentakserver.plugins.Plugin import Plugin
 from opentakserver.extensions import apscheduler, logger
 
-from .default_config import DefaultConfig
-from .feed_manager import scheduled_fetch_and_publish_feed, fetch_and_publish_feed, clear_feed
-import importlib.metadata
+from .default_config import DefaultConfig, CONFIG_KEYS, CONFIG_DEFAULTS, load_yaml_config
+
+# feed_manager (and with it pika, orjson and requests) and importlib.metadata are
+# imported inside the functions that use them, so loading the plugin stays cheap
+# until a feed is actually scheduled or fetched.
+
+
+@functools.lru_cache
+def _cached_metadata(distro):
+    import importlib.metadata
+    return importlib.metadata.metadata(distro).json
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_pkg_distributions():
+    import importlib.metadata
+    return importlib.metadata.packages_distributions()
 
 
 class ArcGISFeedPlugin(Plugin):
@@ -36,6 +51,10 @@ class ArcGISFeedPlugin(Plugin):
                 logger.info("ArcGIS Feed plugin is disabled via config")
                 return
 
+            from .feed_manager import (
+                scheduled_fetch_and_publish_feed, keep_connections_alive, RABBITMQ_KEEPALIVE_SECONDS,
+            )
+
             feeds = self._config.get("OTS_ARCGIS_FEED_FEEDS", [])
             for feed in feeds:
                 job_id = f"arcgis_feed_{feed['name']}"
@@ -52,6 +71,16 @@ class ArcGISFeedPlugin(Plugin):
                 self._job_ids.append(job_id)
                 logger.info(f"Scheduled ArcGIS feed '{feed['name']}' every {interval} minutes")
 
+            if feeds:
+                apscheduler.add_job(
+                    id="arcgis_feed_rabbitmq_keepalive",
+                    func=keep_connections_alive,
+                    trigger="interval",
+                    seconds=RABBITMQ_KEEPALIVE_SECONDS,
+                    replace_existing=True,
+                )
+                self._job_ids.append("arcgis_feed_rabbitmq_keepalive")
+
             logger.info(f"Successfully loaded {self.name}")
         except BaseException as e:
             logger.error(f"Failed to load {self.name}: {e}")
@@ -60,7 +89,7 @@ class ArcGISFeedPlugin(Plugin):
     def load_metadata(self):
         try:
             self.distro = pathlib.Path(__file__).resolve().parent.name
-            self.metadata = importlib.metadata.metadata(self.distro).json
+            self.metadata = dict(_cached_metadata(self.distro))
             self.name = self.metadata['name']
             self.metadata['distro'] = self.distro
             return self.metadata
@@ -70,18 +99,15 @@ class ArcGISFeedPlugin(Plugin):
             return None
 
     def _load_config(self):
-        for key in dir(DefaultConfig):
-            if key.isupper():
-                self._config[key] = getattr(DefaultConfig, key)
-                self._app.config.update({key: getattr(DefaultConfig, key)})
-
-        with open(os.path.join(self._app.config.get("OTS_DATA_FOLDER"), "config.yml")) as yaml_file:
-            yaml_config = yaml.safe_load(yaml_file)
-            for key in self._config.keys():
-                value = yaml_config.get(key)
-                if value:
-                    self._config[key] = value
-                    self._app.config.update({key: value})
+        self._config.update(CONFIG_DEFAULTS)
+        self._app.config.update(CONFIG_DEFAULTS)
+
+        yaml_config = load_yaml_config(os.path.join(self._app.config.get("OTS_DATA_FOLDER"), "config.yml"))
+        for key in self._config.keys():
+            value = yaml_config.get(key)
+            if value:
+                self._config[key] = value
+                self._app.config.update({key: value})
 
     def get_info(self):
         self.load_metadata()
@@ -97,21 +123,27 @@ class ArcGISFeedPlugin(Plugin):
                 logger.debug(f"Could not remove job {job_id}: {e}")
         self._job_ids.clear()
 
+        # Nothing to close if no feed was ever fetched
+        feed_manager = sys.modules.get(f"{__package__}.feed_manager")
+        if feed_manager is not None:
+            feed_manager.close_connections()
+        _cached_metadata.cache_clear()
+        _cached_pkg_distributions.cache_clear()
+
     @staticmethod
     @roles_accepted("administrator")
     @blueprint.route("/")
     def plugin_info():
         try:
             distribution = None
-            distributions = importlib.metadata.packages_distributions()
+            distributions = _cached_pkg_distributions()
             for distro in distributions:
                 if str(__name__).startswith(distro):
                     distribution = distributions[distro][0]
                     break
 
             if distribution:
-                info = importlib.metadata.metadata(distribution)
-                return jsonify(info.json)
+                return jsonify(_cached_metadata(distribution))
             else:
                 return jsonify({'success': False, 'error': 'Plugin not found'}), 404
         except BaseException as e:
@@ -143,10 +175,7 @@ class ArcGISFeedPlugin(Plugin):
     @roles_accepted("administrator")
     @blueprint.route("/config")
     def config():
-        config = {}
-        for key in dir(DefaultConfig):
-            if key.isupper():
-                config[key] = app.config.get(key)
+        config = {key: app.config.get(key) for key in CONFIG_KEYS}
         return jsonify(config)
 
     @staticmethod
@@ -170,11 +199,10 @@ class ArcGISFeedPlugin(Plugin):
     def fetch_all():
         """Manually trigger a fetch for all configured feeds."""
         try:
+            from .feed_manager import fetch_and_publish_feeds
+
             feeds = app.config.get("OTS_ARCGIS_FEED_FEEDS", [])
-            results = []
-            for feed in feeds:
-                result = fetch_and_publish_feed(feed)
-                results.append(result)
+            results = fetch_and_publish_feeds(feeds)
             return jsonify({"success": True, "feeds": results})
         except BaseException as e:
             logger.error(f"Failed to fetch feeds: {e}")
@@ -187,6 +215,8 @@ class ArcGISFeedPlugin(Plugin):
     def fetch_one(feed_name):
         """Manually trigger a fetch for a single feed by name."""
         try:
+            from .feed_manager import fetch_and_publish_feed
+
             feeds = app.config.get("OTS_ARCGIS_FEED_FEEDS", [])
             for feed in feeds:
                 if feed["name"] == feed_name:
@@ -204,6 +234,8 @@ class ArcGISFeedPlugin(Plugin):
     def clear_one(feed_name):
         """Delete all markers for a feed from ATAK clients."""
         try:
+            from .feed_manager import clear_feed
+
             feeds = app.config.get("OTS_ARCGIS_FEED_FEEDS", [])
             for feed in feeds:
                 if feed["name"] == feed_name:
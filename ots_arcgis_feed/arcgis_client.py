@@ -1,47 +1,135 @@
 import traceback
 
+import ijson
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from opentakserver.extensions import logger
 
 # Internal/computed fields to skip in remarks
-SKIP_FIELDS = {
+SKIP_FIELDS = frozenset({
     "FID", "OBJECTID", "OBJECTID_1", "ObjectId", "SourceOID",
     "Shape__Length", "Shape__Len", "Shape__Area",
     "GlobalID", "SourceGlobalID", "IrwinID",
     "CreatedOnDateTime_dt", "ModifiedOnDateTime_dt",
-}
+})
+
+# Upper bound on feeds fetched concurrently, also the size of the session's connection pool
+MAX_CONCURRENT_FETCHES = 8
+
+# Shared keep-alive session so each scheduled fetch reuses pooled TCP/TLS connections.
+# Only gateway errors are retried: retrying connect or read timeouts would stretch a
+# hung FeatureServer to several times OTS_ARCGIS_FEED_REQUEST_TIMEOUT.
+_SESSION = requests.Session()
+_SESSION.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+_ADAPTER = HTTPAdapter(
+    pool_connections=MAX_CONCURRENT_FETCHES, pool_maxsize=MAX_CONCURRENT_FETCHES,
+    max_retries=Retry(
+        total=2, connect=0, read=False, backoff_factor=0.2,
+        status_forcelist=[502, 503, 504], raise_on_status=False,
+    ),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# Bytes read from the response per parser step when streaming features
+_CHUNK_SIZE = 64 * 1024
+
+# Common name fields tried in order when the configured callsign field is empty
+_CALLSIGN_FALLBACKS = ("IncidentName", "InstallationName", "Plant_Name", "Name", "NAME", "Affiliation", "OWNER")
+
+
+def _norm(val: object) -> str | None:
+    """Return val as a stripped string, or None if it is empty."""
+    if not val:
+        return None
+    return str(val).strip() or None
 
 
-def fetch_arcgis_features(url, timeout=30):
-    """Fetch features from an ArcGIS FeatureServer query endpoint.
+class _ResponseReader:
+    """File-like view of a streamed response body for ijson's pull parser.
 
-    Returns a list of feature dicts, or an empty list on failure.
+    Keeps the bytes read until stop_recording() is called, so an ArcGIS error
+    object can still be read from a response that turned out to have no features.
     """
-    try:
-        r = requests.get(url, timeout=timeout)
 
-        if r.status_code != 200:
-            logger.error(f"ArcGIS request failed with status {r.status_code}: {r.text}")
-            return []
+    def __init__(self, response):
+        self._chunks = response.iter_content(chunk_size=_CHUNK_SIZE)
+        self._recording = True
+        self.head = bytearray()
 
-        data = r.json()
+    def read(self, size=-1):
+        # ijson probes the stream type with read(0)
+        if size == 0:
+            return b""
+        chunk = next(self._chunks, b"")
+        if self._recording:
+            self.head += chunk
+        return chunk
 
-        if "error" in data:
-            logger.error(f"ArcGIS API error: {data['error']}")
-            return []
+    def stop_recording(self):
+        self._recording = False
+        self.head = bytearray()
 
-        features = data.get("features", [])
-        logger.info(f"Fetched {len(features)} features from ArcGIS")
-        return features
-    except BaseException as e:
-        logger.error(f"Failed to fetch ArcGIS features: {e}")
-        logger.error(traceback.format_exc())
-        return []
+
+def fetch_arcgis_features(url, timeout=30):
+    """Stream features from an ArcGIS FeatureServer query endpoint.
+
+    Yields feature dicts as they are parsed from the response body, so the full
+    JSON document is never held in memory. Yields nothing if the server answers
+    with a non-200 status or an ArcGIS error object. Connection errors, timeouts,
+    exhausted retries and malformed or truncated JSON are raised, so a failed
+    fetch is never mistaken for a complete feed.
+    """
+    with _SESSION.get(url, timeout=timeout, stream=True) as r:
+        if r.status_code != 200:
+            logger.error(f"ArcGIS request failed with status {r.status_code}: {r.text}")
+            return
+
+        # ijson's pull API lets the C backend build each feature object; its push
+        # (coroutine) API routes every event through Python-level send() calls
+        reader = _ResponseReader(r)
+        count = 0
+        for feature in ijson.items(reader, "features.item", use_float=True):
+            if count == 0:
+                reader.stop_recording()
+            count += 1
+            yield feature
+
+        if count == 0:
+            # A response carrying features is never an error response, so only
+            # a feature-less body needs checking for an error object
+            data = orjson.loads(reader.head)
+            if isinstance(data, dict) and "error" in data:
+                logger.error(f"ArcGIS API error: {data['error']}")
+                return
+
+        logger.info(f"Fetched {count} features from ArcGIS")
+
+
+def remark_fields(feature: object) -> tuple[str, ...]:
+    """Return the attribute names of a feature that are eligible for remarks.
+
+    Every feature in a query response shares the same fields, so this is
+    computed once per fetch and passed to parse_feature. Malformed features
+    yield no fields rather than raising.
+    """
+    if not isinstance(feature, dict):
+        return ()
+    attributes = feature.get("attributes") or {}
+    if not isinstance(attributes, dict):
+        return ()
+    return tuple(key for key in attributes if key not in SKIP_FIELDS)
 
 
-def parse_feature(feature, callsign_field="InstallationName"):
+def parse_feature(feature: dict, callsign_field: str | None = "InstallationName",
+                  allowed_keys: tuple[str, ...] | None = None) -> dict | None:
     """Extract location, callsign, and remarks from a single ArcGIS feature.
 
+    allowed_keys is the result of remark_fields() for the feed, computed from
+    the feature itself if not given.
+
     Returns a dict with keys: lat, lon, object_id, callsign, remarks
     or None if the feature lacks valid geometry.
     """
@@ -57,24 +145,22 @@ def parse_feature(feature, callsign_field="InstallationName"):
         object_id = attr.get("OBJECTID") or attr.get("OBJECTID_1") or attr.get("FID") or attr.get("ObjectId")
 
         # Use configured callsign field, then try common name fields
-        callsign = attr.get(callsign_field)
-        if not callsign or str(callsign).strip() == "":
-            for field in ("IncidentName", "InstallationName", "Plant_Name",
-                          "Name", "NAME", "Affiliation", "OWNER"):
-                val = attr.get(field)
-                if val and str(val).strip():
-                    callsign = val
-                    break
-        if not callsign or str(callsign).strip() == "":
-            callsign = "Unknown"
+        callsign = _norm(attr.get(callsign_field)) or next(
+            (name for field in _CALLSIGN_FALLBACKS if (name := _norm(attr.get(field)))), "Unknown"
+        )
 
         # Build remarks from all non-null, non-internal attributes
+        if allowed_keys is None:
+            allowed_keys = remark_fields(feature)
         remarks_parts = []
-        for key, val in attr.items():
-            if key in SKIP_FIELDS:
+        for key in allowed_keys:
+            val = attr.get(key)
+            # Only the integer/string sentinel is skipped, matching str(val) != "-999999"
+            if val is None or val == "-999999" or (type(val) is int and val == -999999):
+                continue
+            if isinstance(val, str) and not val.strip():
                 continue
-            if val is not None and str(val).strip() and str(val) != "-999999":
-                remarks_parts.append(f"{key}: {val}")
+            remarks_parts.append(f"{key}: {val}")
 
         remarks = "\n".join(remarks_parts) if remarks_parts else ""
 
@@ -82,7 +168,7 @@ def parse_feature(feature, callsign_field="InstallationName"):
             "lat": lat,
             "lon": lon,
             "object_id": object_id,
-            "callsign": str(callsign).strip(),
+            "callsign": callsign,
             "remarks": remarks,
         }
     except BaseException as e:
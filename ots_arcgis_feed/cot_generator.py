@@ -1,16 +1,37 @@
 import datetime
 from xml.etree.ElementTree import Element, SubElement
+from xml.sax.saxutils import escape
 from opentakserver.functions import iso8601_string_from_datetime
 
 UNKNOWN = "9999999.0"
 
+# Serialized form of generate_event + generate_point + contact/remarks details,
+# used to skip building an ElementTree for every published feature
+_COT_HEAD = (
+    '<event version="2.0" start="{start}" time="{start}" stale="{stale}" uid="{uid}" type="{cot_type}" how="h-e">'
+    f'<point lat="{{lat}}" lon="{{lon}}" ce="{UNKNOWN}" hae="{UNKNOWN}" le="{UNKNOWN}" />'
+    '<detail><contact callsign="{callsign}" />'
+)
+_COT_TEMPLATE = _COT_HEAD + "</detail></event>"
+_COT_TEMPLATE_WITH_REMARKS = _COT_HEAD + "<remarks>{remarks}</remarks></detail></event>"
+
+# Matches the attribute escaping done by ElementTree.tostring
+_ATTRIBUTE_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"}
+
 
 def generate_event(start_time: datetime.datetime, stale_time: datetime.datetime, uid: str, cot_type="a-f-G-U-C", how="h-e") -> Element:
+    return generate_event_iso(
+        iso8601_string_from_datetime(start_time), iso8601_string_from_datetime(stale_time), uid, cot_type, how,
+    )
+
+
+def generate_event_iso(start_iso: str, stale_iso: str, uid: str, cot_type="a-f-G-U-C", how="h-e") -> Element:
+    """Like generate_event, but with timestamps already formatted as ISO 8601 strings."""
     return Element("event", {
         "version": "2.0",
-        "start": iso8601_string_from_datetime(start_time),
-        "time": iso8601_string_from_datetime(start_time),
-        "stale": iso8601_string_from_datetime(stale_time),
+        "start": start_iso,
+        "time": start_iso,
+        "stale": stale_iso,
         "uid": str(uid),
         "type": cot_type,
         "how": how,
@@ -22,13 +43,30 @@ def generate_point(event: Element, lat=UNKNOWN, lon=UNKNOWN, ce=UNKNOWN, hae=UNK
     return event
 
 
-def add_detail(event: Element, tag_name: str, attributes: dict[str, str], text: str = None) -> Element:
+def add_detail(event: Element, tag_name: str, attributes: dict[str, str], text: str | None = None) -> Element:
     detail = event.find("detail")
-    if not detail:
+    if detail is None:
         detail = SubElement(event, "detail")
 
     SubElement(detail, tag_name, attributes).text = text
-
-    if not event.find("detail"):
-        event.append(detail)
     return event
+
+
+def build_cot_xml(uid: str, lat, lon, callsign: str, remarks: str, cot_type: str, start_iso: str, stale_iso: str) -> str:
+    """Serialize a feature CoT event straight from a string template.
+
+    Produces the same XML as generate_event, generate_point and add_detail for
+    the contact and (optional) remarks details. Timestamps must already be
+    ISO 8601 strings so they can be formatted once per feed tick.
+    """
+    template = _COT_TEMPLATE_WITH_REMARKS if remarks else _COT_TEMPLATE
+    return template.format(
+        start=start_iso,
+        stale=stale_iso,
+        uid=escape(str(uid), _ATTRIBUTE_ENTITIES),
+        cot_type=escape(cot_type, _ATTRIBUTE_ENTITIES),
+        lat=lat,
+        lon=lon,
+        callsign=escape(callsign, _ATTRIBUTE_ENTITIES),
+        remarks=escape(remarks),
+    )
@@ -1,10 +1,56 @@
 import os
+import tempfile
 import traceback
 from dataclasses import dataclass
 from opentakserver.extensions import logger
 from flask import current_app as app
 import yaml
 
+# Prefer the libyaml C implementation when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Last parsed config.yml, reused until the file's mtime changes
+_YAML_CACHE = {"path": None, "mtime": 0, "data": None}
+
+
+def load_yaml_config(path: str) -> dict:
+    """Return the parsed YAML file at path, only re-reading it when it has been modified.
+
+    The returned dict is shared with the cache and must not be mutated.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    if _YAML_CACHE["path"] != path or _YAML_CACHE["mtime"] != mtime:
+        with open(path) as yaml_file:
+            data = yaml.load(yaml_file, Loader=_YAML_LOADER) or {}
+        _YAML_CACHE.update(path=path, mtime=mtime, data=data)
+    return _YAML_CACHE["data"]
+
+
+def save_yaml_config(path: str, config: dict):
+    """Atomically replace the YAML file at path and refresh the cache.
+
+    Symlinks are resolved first so the link's target is replaced, not the link.
+    """
+    real_path = os.path.realpath(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(real_path), prefix=".config.yml.")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            yaml.dump(config, tmp_file, Dumper=_YAML_DUMPER)
+        if os.path.exists(real_path):
+            st = os.stat(real_path)
+            os.chmod(tmp_path, st.st_mode & 0o777)
+            if hasattr(os, "chown"):
+                try:
+                    os.chown(tmp_path, st.st_uid, st.st_gid)
+                except PermissionError:
+                    logger.debug(f"Could not keep the owner of {real_path}")
+        os.replace(tmp_path, real_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _YAML_CACHE.update(path=path, mtime=os.stat(path).st_mtime_ns, data=config)
+
 
 @dataclass
 class DefaultConfig:
@@ -16,11 +62,13 @@ class DefaultConfig:
 
     OTS_ARCGIS_FEED_FEEDS = []
 
+    OTS_ARCGIS_FEED_PARSE_WORKERS = 0
+
     @staticmethod
     def validate(config: dict) -> dict[str, bool | str]:
         try:
             for key, value in config.items():
-                if key not in DefaultConfig.__dict__.keys():
+                if key not in CONFIG_KEYS:
                     return {"success": False, "error": f"{key} is not a valid config key"}
 
                 if key == "OTS_ARCGIS_FEED_ENABLED" and not isinstance(value, bool):
@@ -31,6 +79,9 @@ class DefaultConfig:
                     return {"success": False, "error": f"{key} should be a string"}
                 elif key == "OTS_ARCGIS_FEED_FEEDS" and not isinstance(value, list):
                     return {"success": False, "error": f"{key} should be a list"}
+                elif key == "OTS_ARCGIS_FEED_PARSE_WORKERS" and (
+                        isinstance(value, bool) or not isinstance(value, int) or value < 0):
+                    return {"success": False, "error": f"{key} should be a non-negative integer"}
 
             return {"success": True, "error": ""}
         except BaseException as e:
@@ -40,15 +91,14 @@ class DefaultConfig:
     @staticmethod
     def save_config_settings(settings: dict[str, any]):
         try:
-            with open(os.path.join(app.config.get("OTS_DATA_FOLDER"), "config.yml"), "r") as config_file:
-                config = yaml.safe_load(config_file.read())
+            config_path = os.path.join(app.config.get("OTS_DATA_FOLDER"), "config.yml")
+            config = dict(load_yaml_config(config_path))
 
             for setting, value in settings.items():
                 config[setting] = value
                 app.config.update({setting: value})
 
-            with open(os.path.join(app.config.get("OTS_DATA_FOLDER"), "config.yml"), "w") as config_file:
-                yaml.safe_dump(config, config_file)
+            save_yaml_config(config_path, config)
 
         except BaseException as e:
             logger.error(f"Failed to save settings {settings}: {e}")
@@ -66,3 +116,8 @@ class DefaultConfig:
             logger.error(f"Failed to update config: {e}")
             logger.error(traceback.format_exc())
             return {"success": False, "error": str(e)}
+
+
+# Config keys and their defaults, computed once instead of scanning dir(DefaultConfig) per request
+CONFIG_KEYS = tuple(key for key in vars(DefaultConfig) if key.isupper())
+CONFIG_DEFAULTS = {key: getattr(DefaultConfig, key) for key in CONFIG_KEYS}
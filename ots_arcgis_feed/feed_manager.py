@@ -1,22 +1,217 @@
 import datetime
-import json
+import functools
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
 import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from xml.etree.ElementTree import tostring
 
+import orjson
 import pika
 from flask import current_app as app
 
 from opentakserver.extensions import apscheduler, logger
+from opentakserver.functions import iso8601_string_from_datetime
 
-from .arcgis_client import fetch_arcgis_features, parse_feature
-from .cot_generator import generate_event, generate_point, add_detail
+from .arcgis_client import fetch_arcgis_features, parse_feature, remark_fields, MAX_CONCURRENT_FETCHES
+from .uid_store import UidStore
+from .cot_generator import generate_event_iso, generate_point, build_cot_xml
 
-# Track UIDs per feed so we can delete removed markers
-_previous_uids = {}
+# Track UIDs per feed so we can delete removed markers, opened lazily by _get_uid_store
+_uid_store = None
+_uid_store_lock = threading.Lock()
 
+# How often the idle RabbitMQ connection services heartbeats. Must be well under
+# half the broker's heartbeat timeout (RabbitMQ default: 60 s)
+RABBITMQ_KEEPALIVE_SECONDS = 20
 
-def _publish_to_exchanges(channel, group, message, properties):
-    """Publish a CoT message to all 3 RabbitMQ exchanges."""
+# Smaller feeds are parsed inline, since pickling features to worker
+# processes would cost more than the parallel parse saves
+PARALLEL_PARSE_THRESHOLD = 2000
+PARALLEL_PARSE_CHUNKSIZE = 64
+
+# forkserver is unavailable on Windows, where spawn is the only start method that avoids forking
+_PARSE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Process pool for parsing large feeds, created lazily by _get_parse_executor
+_parse_executor = None
+_parse_executor_workers = 0
+_parse_executor_lock = threading.Lock()
+
+
+class _RabbitPool:
+    """Lazily opened RabbitMQ connection shared by all feeds.
+
+    Reused across scheduled fetches so each tick only pays for basic_publish,
+    not the TCP/AMQP handshake. pika only answers broker heartbeats while it
+    processes I/O, so keepalive() must run every RABBITMQ_KEEPALIVE_SECONDS to
+    stop the broker dropping the connection between ticks. The channel runs in
+    transaction mode so a whole batch is flushed with a single tx_commit round
+    trip. Access is serialized with a lock since pika's BlockingConnection is
+    not thread safe.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._key = None
+        self._connection = None
+        self._channel = None
+        self._declared_groups = set()
+
+    def channel(self, group):
+        """Return an open channel with the group exchange declared.
+
+        Must be called within a Flask app context while holding the lock.
+        """
+        host = app.config.get("OTS_RABBITMQ_SERVER_ADDRESS")
+        username = app.config.get("OTS_RABBITMQ_USERNAME")
+        if self._key != (host, username) or not self._is_open():
+            self.close()
+            rabbit_credentials = pika.PlainCredentials(username, app.config.get("OTS_RABBITMQ_PASSWORD"))
+            self._connection = pika.BlockingConnection(
+                pika.ConnectionParameters(host=host, credentials=rabbit_credentials)
+            )
+            self._channel = self._connection.channel()
+            self._channel.tx_select()
+            self._key = (host, username)
+
+        if group not in self._declared_groups:
+            self._channel.exchange_declare(exchange=group, exchange_type="fanout")
+            self._declared_groups.add(group)
+        return self._channel
+
+    def _is_open(self):
+        if self._connection is None or not self._connection.is_open or not self._channel.is_open:
+            return False
+        try:
+            # Services heartbeats and surfaces a connection the broker dropped while idle
+            self._connection.process_data_events(time_limit=0)
+            return True
+        except pika.exceptions.AMQPError as e:
+            logger.debug(f"Discarding stale RabbitMQ connection: {e}")
+            return False
+
+    def keepalive(self):
+        """Service heartbeats on the idle connection, dropping it if the broker closed it."""
+        # A publish in progress is already servicing the connection
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self._connection is not None and not self._is_open():
+                self.close()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None and self._connection.is_open:
+                try:
+                    self._connection.close()
+                except pika.exceptions.AMQPError as e:
+                    logger.debug(f"Failed to close RabbitMQ connection: {e}")
+            self._key = None
+            self._connection = None
+            self._channel = None
+            self._declared_groups.clear()
+
+
+_rabbit_pool = _RabbitPool()
+
+
+def _get_uid_store():
+    """Return the UID store, opening it in OTS_DATA_FOLDER on first use.
+
+    Must be called within a Flask app context.
+    """
+    global _uid_store
+    with _uid_store_lock:
+        if _uid_store is None:
+            _uid_store = UidStore(os.path.join(app.config.get("OTS_DATA_FOLDER"), "ots_arcgis_feed.db"))
+        return _uid_store
+
+
+def _parse_worker_count():
+    """Return OTS_ARCGIS_FEED_PARSE_WORKERS as an int, treating invalid values as 0 (disabled).
+
+    Must be called within a Flask app context.
+    """
+    value = app.config.get("OTS_ARCGIS_FEED_PARSE_WORKERS", 0)
+    try:
+        if isinstance(value, bool):
+            raise TypeError("booleans are not worker counts")
+        return max(int(value or 0), 0)
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid OTS_ARCGIS_FEED_PARSE_WORKERS value {value!r}, parsing in the calling thread")
+        return 0
+
+
+def _get_parse_executor(workers):
+    """Return a process pool with the given number of workers, replacing the old one if the count changed.
+
+    Workers are started from a forkserver (or spawned where forkserver is
+    unavailable, e.g. on Windows) rather than forked from the multi-threaded
+    OTS process, where a child could inherit a lock (such as the logging lock)
+    held by another thread and deadlock.
+    """
+    global _parse_executor, _parse_executor_workers
+    with _parse_executor_lock:
+        if _parse_executor is None or _parse_executor_workers != workers:
+            if _parse_executor is not None:
+                _parse_executor.shutdown(wait=False)
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(_PARSE_START_METHOD),
+            )
+            _parse_executor_workers = workers
+        return _parse_executor
+
+
+def keep_connections_alive():
+    """APScheduler entry point — services heartbeats on the shared RabbitMQ connection."""
+    _rabbit_pool.keepalive()
+
+
+def close_connections():
+    """Close the shared RabbitMQ connection, UID store and parse pool. All are reopened on next use."""
+    global _uid_store, _parse_executor
+    _rabbit_pool.close()
+    with _uid_store_lock:
+        if _uid_store is not None:
+            _uid_store.close()
+            _uid_store = None
+    with _parse_executor_lock:
+        if _parse_executor is not None:
+            _parse_executor.shutdown(wait=False)
+            _parse_executor = None
+
+
+def _publish_to_exchanges(group, messages, properties):
+    """Publish a batch of CoT messages to all 3 RabbitMQ exchanges in one transaction.
+
+    An uncommitted transaction is discarded by the broker when the connection drops,
+    so the whole batch is safely retried once on a fresh connection.
+    """
+    if not messages:
+        return
+
+    with _rabbit_pool.lock:
+        try:
+            _publish_batch(_rabbit_pool.channel(group), group, messages, properties)
+        except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError) as e:
+            logger.warning(f"RabbitMQ connection lost, reconnecting: {e}")
+            _rabbit_pool.close()
+            _publish_batch(_rabbit_pool.channel(group), group, messages, properties)
+
+
+def _publish_batch(channel, group, messages, properties):
+    for message in messages:
+        _basic_publish(channel, group, message, properties)
+    channel.tx_commit()
+
+
+def _basic_publish(channel, group, message, properties):
     channel.basic_publish(
         exchange="cot_parser", routing_key="", body=message, properties=properties,
     )
@@ -28,12 +223,86 @@ def _publish_to_exchanges(channel, group, message, properties):
     )
 
 
+def _delete_messages(uids, start_iso, stale_iso):
+    """Build delete (t-x-d-d) CoT messages for uids.
+
+    All fields except the uid are the same for every marker, so a single event
+    element is built once and only its uid is changed before each serialization.
+    Must be called within a Flask app context.
+    """
+    delete_event = generate_point(generate_event_iso(start_iso, stale_iso, uid="", cot_type="t-x-d-d"))
+    node_id = app.config["OTS_NODE_ID"]
+    messages = []
+    for uid in uids:
+        delete_event.set("uid", uid)
+        messages.append(orjson.dumps({"cot": tostring(delete_event, encoding="unicode"), "uid": node_id}))
+    return messages
+
+
 def scheduled_fetch_and_publish_feed(feed_config):
     """APScheduler entry point — wraps fetch_and_publish_feed with app context."""
     with apscheduler.app.app_context():
         fetch_and_publish_feed(feed_config)
 
 
+def _fingerprint(*values) -> int:
+    """Return a stable signed 64-bit hash of values, sized to fit a SQLite INTEGER."""
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def parse_and_build(feature: dict, feed_name: str, callsign_field: str | None, allowed_keys: tuple[str, ...],
+                    cot_type: str, cot_type_field: str | None, cot_type_mapping: dict[str, str],
+                    start_iso: str, stale_iso: str) -> tuple[str, int, str] | None:
+    """Parse one ArcGIS feature and build its CoT XML.
+
+    Returns a (uid, fingerprint, cot_xml) tuple, or None if the feature has no
+    valid geometry. The fingerprint covers everything in the event except its
+    timestamps. Kept free of Flask app state so it can run in a worker process.
+    """
+    parsed = parse_feature(feature, callsign_field=callsign_field, allowed_keys=allowed_keys)
+    if parsed is None:
+        return None
+
+    uid = f"arcgis-{feed_name}-{parsed['object_id']}"
+
+    # Resolve per-feature CoT type from mapping, fall back to feed default
+    feature_cot_type = cot_type
+    if cot_type_field and cot_type_mapping:
+        field_value = feature.get("attributes", {}).get(cot_type_field)
+        if field_value is not None:
+            feature_cot_type = cot_type_mapping.get(str(field_value), cot_type)
+
+    cot_xml = build_cot_xml(
+        uid, parsed["lat"], parsed["lon"], parsed["callsign"], parsed["remarks"],
+        feature_cot_type, start_iso, stale_iso,
+    )
+    fingerprint = _fingerprint(
+        parsed["object_id"], parsed["lat"], parsed["lon"], parsed["callsign"], parsed["remarks"], feature_cot_type,
+    )
+    return uid, fingerprint, cot_xml
+
+
+def fetch_and_publish_feeds(feed_configs):
+    """Fetch and publish several feeds concurrently.
+
+    The ArcGIS requests are I/O bound, so running them on a thread pool makes
+    the wall time roughly that of the slowest feed instead of the sum of all.
+    Must be called within a Flask app context. Returns result dicts in feed order.
+    """
+    if not feed_configs:
+        return []
+
+    flask_app = app._get_current_object()
+
+    def run(feed_config):
+        with flask_app.app_context():
+            return fetch_and_publish_feed(feed_config)
+
+    with ThreadPoolExecutor(max_workers=min(len(feed_configs), MAX_CONCURRENT_FETCHES)) as executor:
+        return list(executor.map(run, feed_configs))
+
+
 def fetch_and_publish_feed(feed_config):
     """Fetch ArcGIS features, publish CoT events, delete removed markers.
 
@@ -46,6 +315,7 @@ def fetch_and_publish_feed(feed_config):
     cot_type = feed_config.get("cot_type", "a-f-G-U-C")
     cot_type_field = feed_config.get("cot_type_field")
     cot_type_mapping = feed_config.get("cot_type_mapping", {})
+    skip_unchanged = feed_config.get("skip_unchanged", False)
     group = feed_config.get("group", "__ANON__")
     timeout = app.config.get("OTS_ARCGIS_FEED_REQUEST_TIMEOUT", 30)
     callsign_field = feed_config.get("callsign_field",
@@ -53,84 +323,80 @@ def fetch_and_publish_feed(feed_config):
 
     try:
         features = fetch_arcgis_features(feed_url, timeout=timeout)
-        if not features:
+        first_feature = next(features, None)
+        if first_feature is None:
             logger.warning(f"ArcGIS feed '{feed_name}': no features returned")
-            return {"success": True, "feed": feed_name, "published": 0, "deleted": 0, "total_features": 0}
-
-        rabbit_credentials = pika.PlainCredentials(
-            app.config.get("OTS_RABBITMQ_USERNAME"),
-            app.config.get("OTS_RABBITMQ_PASSWORD"),
-        )
-        rabbit_connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=app.config.get("OTS_RABBITMQ_SERVER_ADDRESS"),
-                credentials=rabbit_credentials,
-            )
-        )
-        channel = rabbit_connection.channel()
-        channel.exchange_declare(exchange=group, exchange_type="fanout")
+            return {"success": True, "feed": feed_name, "published": 0, "unchanged": 0, "deleted": 0, "total_features": 0}
+        features = itertools.chain((first_feature,), features)
 
         now = datetime.datetime.now(datetime.timezone.utc)
         stale_time = now + datetime.timedelta(minutes=stale_minutes)
+        start_iso = iso8601_string_from_datetime(now)
+        stale_iso = iso8601_string_from_datetime(stale_time)
         properties = pika.BasicProperties(
             expiration=app.config.get("OTS_RABBITMQ_TTL"),
         )
-        published = 0
-        current_uids = set()
+        # A malformed first feature yields no fields; let parse_feature derive them per feature instead.
+        build = functools.partial(
+            parse_and_build, feed_name=feed_name, callsign_field=callsign_field,
+            allowed_keys=remark_fields(first_feature) or None, cot_type=cot_type, cot_type_field=cot_type_field,
+            cot_type_mapping=cot_type_mapping, start_iso=start_iso, stale_iso=stale_iso,
+        )
 
-        for feature in features:
-            parsed = parse_feature(feature, callsign_field=callsign_field)
-            if parsed is None:
+        # CPU-bound parsing of large feeds goes to a process pool; publishing stays in this thread.
+        # Features stream in from the response, so buffer up to the threshold to size the feed.
+        use_parse_pool = False
+        parse_workers = _parse_worker_count()
+        if parse_workers > 0:
+            head = list(itertools.islice(features, PARALLEL_PARSE_THRESHOLD))
+            use_parse_pool = len(head) == PARALLEL_PARSE_THRESHOLD
+            features = itertools.chain(head, features)
+        if use_parse_pool:
+            built = _get_parse_executor(parse_workers).map(build, features, chunksize=PARALLEL_PARSE_CHUNKSIZE)
+        else:
+            built = map(build, features)
+
+        # Serialize each message as its feature is built so only one copy of the CoT
+        # (as message bytes) is held until the batch is published
+        node_id = app.config["OTS_NODE_ID"]
+        feature_messages = []
+        fingerprints = {}
+        total_features = 0
+        for result in built:
+            total_features += 1
+            if result is None:
                 continue
-
-            uid = f"arcgis-{feed_name}-{parsed['object_id']}"
-            current_uids.add(uid)
-
-            # Resolve per-feature CoT type from mapping, fall back to feed default
-            feature_cot_type = cot_type
-            if cot_type_field and cot_type_mapping:
-                field_value = feature.get("attributes", {}).get(cot_type_field)
-                if field_value is not None:
-                    feature_cot_type = cot_type_mapping.get(str(field_value), cot_type)
-
-            event = generate_event(
-                start_time=now, stale_time=stale_time, uid=uid, cot_type=feature_cot_type,
-            )
-            event = generate_point(event, lat=parsed["lat"], lon=parsed["lon"])
-            event = add_detail(event, "contact", {"callsign": parsed["callsign"]})
-            if parsed["remarks"]:
-                event = add_detail(event, "remarks", {}, text=parsed["remarks"])
-
-            cot_xml = tostring(event, encoding="unicode")
-            message = json.dumps({"cot": cot_xml, "uid": app.config["OTS_NODE_ID"]})
-            _publish_to_exchanges(channel, group, message, properties)
-            published += 1
+            uid, fingerprint, cot_xml = result
+            fingerprints[uid] = fingerprint
+            feature_messages.append((uid, orjson.dumps({"cot": cot_xml, "uid": node_id})))
+
+        # Skip features identical to their last publish, but republish them once half
+        # their stale time has passed so markers never go stale on clients
+        refresh_before = now.timestamp() - stale_minutes * 60 / 2 if skip_unchanged else None
+        uid_store = _get_uid_store()
+        unchanged, removed = uid_store.diff(feed_name, fingerprints, published_after=refresh_before)
+
+        messages = [message for uid, message in feature_messages if uid not in unchanged]
+        del feature_messages
+        published = len(messages)
+        published_fingerprints = {
+            uid: fingerprint for uid, fingerprint in fingerprints.items() if uid not in unchanged
+        }
 
         # Delete markers that no longer exist in the feed
-        previous = _previous_uids.get(feed_name, set())
-        removed = previous - current_uids
-        for uid in removed:
-            delete_event = generate_event(
-                start_time=now, stale_time=stale_time, uid=uid, cot_type="t-x-d-d",
-            )
-            delete_event = generate_point(delete_event)
-            cot_xml = tostring(delete_event, encoding="unicode")
-            message = json.dumps({"cot": cot_xml, "uid": app.config["OTS_NODE_ID"]})
-            _publish_to_exchanges(channel, group, message, properties)
-
-        _previous_uids[feed_name] = current_uids
+        messages.extend(_delete_messages(removed, start_iso, stale_iso))
 
-        channel.close()
-        rabbit_connection.close()
+        _publish_to_exchanges(group, messages, properties)
+        uid_store.update(feed_name, published_fingerprints, removed, published_at=now.timestamp())
 
         logger.info(
-            f"ArcGIS feed '{feed_name}': published {published}/{len(features)} CoT events, "
-            f"deleted {len(removed)} removed markers"
+            f"ArcGIS feed '{feed_name}': published {published}/{total_features} CoT events, "
+            f"skipped {len(unchanged)} unchanged, deleted {len(removed)} removed markers"
         )
         return {
             "success": True, "feed": feed_name,
-            "published": published, "deleted": len(removed),
-            "total_features": len(features),
+            "published": published, "unchanged": len(unchanged), "deleted": len(removed),
+            "total_features": total_features,
         }
 
     except BaseException as e:
@@ -144,43 +410,25 @@ def clear_feed(feed_name, group="__ANON__"):
 
     Must be called within a Flask app context.
     """
-    previous = _previous_uids.get(feed_name, set())
-    if not previous:
-        return {"success": True, "feed": feed_name, "deleted": 0}
-
     try:
-        rabbit_credentials = pika.PlainCredentials(
-            app.config.get("OTS_RABBITMQ_USERNAME"),
-            app.config.get("OTS_RABBITMQ_PASSWORD"),
-        )
-        rabbit_connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=app.config.get("OTS_RABBITMQ_SERVER_ADDRESS"),
-                credentials=rabbit_credentials,
-            )
-        )
-        channel = rabbit_connection.channel()
+        uid_store = _get_uid_store()
+        previous = uid_store.uids(feed_name)
+        if not previous:
+            return {"success": True, "feed": feed_name, "deleted": 0}
 
         now = datetime.datetime.now(datetime.timezone.utc)
         stale_time = now + datetime.timedelta(minutes=1)
+        start_iso = iso8601_string_from_datetime(now)
+        stale_iso = iso8601_string_from_datetime(stale_time)
         properties = pika.BasicProperties(
             expiration=app.config.get("OTS_RABBITMQ_TTL"),
         )
 
-        for uid in previous:
-            delete_event = generate_event(
-                start_time=now, stale_time=stale_time, uid=uid, cot_type="t-x-d-d",
-            )
-            delete_event = generate_point(delete_event)
-            cot_xml = tostring(delete_event, encoding="unicode")
-            message = json.dumps({"cot": cot_xml, "uid": app.config["OTS_NODE_ID"]})
-            _publish_to_exchanges(channel, group, message, properties)
-
-        channel.close()
-        rabbit_connection.close()
+        messages = _delete_messages(previous, start_iso, stale_iso)
+        _publish_to_exchanges(group, messages, properties)
 
         deleted = len(previous)
-        _previous_uids[feed_name] = set()
+        uid_store.clear(feed_name)
         logger.info(f"ArcGIS feed '{feed_name}': cleared {deleted} markers")
         return {"success": True, "feed": feed_name, "deleted": deleted}
 
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+from typing import Iterable
+
+
+class UidStore:
+    """Persists the marker UIDs published for each feed.
+
+    Backed by SQLite so deletion tracking survives restarts: markers that
+    disappear from a feed while OTS was down are still deleted on the next fetch.
+    Each UID also keeps the fingerprint and time of its last publish so
+    unchanged features can be skipped.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS feed_uids (feed TEXT NOT NULL, uid TEXT NOT NULL, "
+            "fingerprint INTEGER, published_at REAL NOT NULL DEFAULT 0, PRIMARY KEY (feed, uid))"
+        )
+        self._conn.execute("CREATE TEMP TABLE current_uids (uid TEXT PRIMARY KEY, fingerprint INTEGER)")
+        self._conn.commit()
+
+    def uids(self, feed: str) -> list[str]:
+        """Return all stored UIDs for a feed."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT uid FROM feed_uids WHERE feed = ?", (feed,))]
+
+    def diff(self, feed: str, fingerprints: dict[str, int],
+             published_after: float | None = None) -> tuple[set[str], list[str]]:
+        """Compare the current fingerprints of a feed against the stored ones.
+
+        Returns (unchanged, removed): the UIDs whose stored fingerprint matches and
+        were last published after published_after (empty if it is None), and the
+        stored UIDs no longer present in fingerprints.
+        """
+        with self._lock, self._conn:
+            self._load_current(fingerprints.items())
+            unchanged = set()
+            if published_after is not None:
+                unchanged = {row[0] for row in self._conn.execute(
+                    "SELECT c.uid FROM current_uids c JOIN feed_uids f ON f.feed = ? AND f.uid = c.uid "
+                    "WHERE f.fingerprint = c.fingerprint AND f.published_at > ?", (feed, published_after),
+                )}
+            removed = [row[0] for row in self._conn.execute(
+                "SELECT uid FROM feed_uids WHERE feed = ? AND uid NOT IN (SELECT uid FROM current_uids)", (feed,),
+            )]
+            return unchanged, removed
+
+    def update(self, feed: str, published: dict[str, int], removed: Iterable[str], published_at: float):
+        """Record the fingerprints of published UIDs and forget removed ones in a single transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO feed_uids (feed, uid, fingerprint, published_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (feed, uid) DO UPDATE SET fingerprint = excluded.fingerprint, "
+                "published_at = excluded.published_at",
+                ((feed, uid, fingerprint, published_at) for uid, fingerprint in published.items()),
+            )
+            self._conn.executemany(
+                "DELETE FROM feed_uids WHERE feed = ? AND uid = ?", ((feed, uid) for uid in removed),
+            )
+
+    def clear(self, feed: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM feed_uids WHERE feed = ?", (feed,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _load_current(self, rows):
+        self._conn.execute("DELETE FROM current_uids")
+        self._conn.executemany("INSERT OR REPLACE INTO current_uids (uid, fingerprint) VALUES (?, ?)", rows)